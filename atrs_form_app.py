@@ -9,7 +9,7 @@ ATSR – Formulário individual por integrante (Streamlit)
 • Inclui **Painel do Organizador** para visualizar e **baixar** os resultados consolidados (ATSR por pessoa, ranking por subgrupo/geral, CSV e XLSX).
 
 Como executar localmente (com Python instalado):
-    pip install streamlit pandas openpyxl
+    pip install streamlit pandas xlsxwriter
     streamlit run atrs_form_app.py
 
 Como empacotar em .EXE (Windows) para quem não tem VS Code / Python:
@@ -21,15 +21,35 @@ Como empacotar em .EXE (Windows) para quem não tem VS Code / Python:
 from __future__ import annotations
 import streamlit as st
 from datetime import datetime
+import atexit
 import csv
+import logging
+import queue
+import shutil
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
 import io
+from itertools import chain
+from uuid import uuid4
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import xlsxwriter
+except ImportError:  # instalações antigas, só com openpyxl
+    xlsxwriter = None
 
 st.set_page_config(page_title="ATSR – Sprint Regular", page_icon="✅", layout="centered")
 
 # ===================== CONFIG ===================== #
 ARQUIVO_SAIDA = Path("respostas_ATSR.csv")
+# Cópia colunar das respostas para o painel (espelho do CSV, num único arquivo)
+ARQUIVO_PARQUET = Path("respostas_ATSR.parquet")
+# Metadado do Parquet com o tamanho (bytes) do CSV que o espelho reflete
+CHAVE_TAMANHO_CSV = b"respostas:csv_size"
 CRITERIOS = [
     "Comunicação",
     "Eficiência durante o processo",
@@ -42,57 +62,152 @@ SUBGRUPOS = {
     "Subgrupo 02": ["João Carlos", "João Patriota", "João Pessôa", "Mateus Dornellas"],
     "Subgrupo 03": ["Antônio Manoel", "Breno Santiago", "Gabriel Ribeiro", "João Henrique"],
 }
-TODOS_NOMES = sum(SUBGRUPOS.values(), [])
+TODOS_NOMES = list(chain.from_iterable(SUBGRUPOS.values()))
+NOME_TO_SUBGRUPO = {n: sg for sg, nomes in SUBGRUPOS.items() for n in nomes}
+SEM_SUBGRUPO = "—"  # avaliado que não está em nenhum subgrupo
+SUBGRUPO_DTYPE = pd.CategoricalDtype([*SUBGRUPOS.keys(), SEM_SUBGRUPO], ordered=True)
+OPCAO_VAZIA = "— selecione —"
+OPCOES_AVALIADOR = [OPCAO_VAZIA, *TODOS_NOMES]
+CABECALHO = (
+    "timestamp",
+    "avaliador_nome",
+    "avaliador_subgrupo",
+    "avaliado_nome",
+    *CRITERIOS,
+    "media_5_criterios",
+)
+# Tipos das colunas do CSV: evita a inferência de tipos do pandas na leitura.
+# Nomes/subgrupos como category: o groupby trabalha sobre códigos inteiros.
+DTYPES_CSV = {
+    "timestamp": str,
+    "avaliador_nome": "category",
+    "avaliador_subgrupo": "category",
+    "avaliado_nome": "category",
+    **dict.fromkeys(CRITERIOS, "float64"),
+    "media_5_criterios": "float64",
+}
+# No Parquet os nomes vão como texto puro (dicionários diferentes por arquivo não se juntam na leitura)
+DTYPES_PARQUET = {
+    **DTYPES_CSV,
+    "avaliador_nome": str,
+    "avaliador_subgrupo": str,
+    "avaliado_nome": str,
+}
 SENHA_ORGANIZADOR = "organizador"  # altere aqui se quiser
 
 # ===================== HELPERS ===================== #
 
 def get_subgrupo_do_nome(nome: str) -> str | None:
-    for sg, nomes in SUBGRUPOS.items():
-        if nome in nomes:
-            return sg
-    return None
-
-@st.cache_data
-def cabecalho_csv() -> list[str]:
-    return [
-        "timestamp",
-        "avaliador_nome",
-        "avaliador_subgrupo",
-        "avaliado_nome",
-        *CRITERIOS,
-        "media_5_criterios",
-    ]
-
-
-def salvar_linha_csv(linha: list[str | float]) -> None:
-    novo_arquivo = not ARQUIVO_SAIDA.exists()
-    with ARQUIVO_SAIDA.open("a", newline="", encoding="utf-8") as f:
+    return NOME_TO_SUBGRUPO.get(nome)
+
+
+def salvar_linhas_csv(linhas: list[tuple[str | float, ...]]) -> None:
+    # Abre o arquivo uma única vez por envio e grava todas as linhas de uma vez.
+    # Em modo append a posição inicial é o fim do arquivo: tell() == 0 indica arquivo novo/vazio.
+    with ARQUIVO_SAIDA.open("a", newline="", buffering=1 << 16, encoding="utf-8") as f:
         writer = csv.writer(f)
-        if novo_arquivo:
-            writer.writerow(cabecalho_csv())
-        writer.writerow(linha)
+        if f.tell() == 0:
+            writer.writerow(CABECALHO)
+        writer.writerows(linhas)
 
 
-def bloco_avaliacao(avaliador_nome: str, avaliado_nome: str) -> float:
+def tamanho_sincronizado() -> int | None:
+    # Lê só o rodapé do Parquet: não abre o CSV nem os dados do espelho
+    if not ARQUIVO_PARQUET.is_file():
+        return None
+    meta = pq.read_metadata(ARQUIVO_PARQUET).metadata or {}
+    valor = meta.get(CHAVE_TAMANHO_CSV)
+    return int(valor) if valor is not None else None
+
+
+def sincronizar_parquet(linhas: list[tuple[str | float, ...]], tamanho_antes: int) -> None:
+    # O CSV é a fonte da verdade; o Parquet é um espelho num único arquivo, regravado a cada envio.
+    tamanho_csv = ARQUIVO_SAIDA.stat().st_size
+    sincronizado = tamanho_sincronizado()
+    if sincronizado == tamanho_csv:
+        return
+    if sincronizado is not None and sincronizado == tamanho_antes:
+        # Espelho estava em dia antes deste envio: basta acrescentar as linhas novas
+        df = pd.concat(
+            [pd.read_parquet(ARQUIVO_PARQUET), pd.DataFrame(linhas, columns=CABECALHO).astype(DTYPES_PARQUET)],
+            ignore_index=True,
+        )
+    else:
+        # Espelho ausente ou atrasado (falha anterior, CSV editado à mão): reconstrói a partir do CSV
+        if ARQUIVO_PARQUET.is_dir():  # layout antigo, uma parte por envio
+            shutil.rmtree(ARQUIVO_PARQUET)
+        df = pd.read_csv(ARQUIVO_SAIDA, usecols=list(DTYPES_PARQUET), dtype=DTYPES_PARQUET)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    tabela = tabela.replace_schema_metadata(
+        {**(tabela.schema.metadata or {}), CHAVE_TAMANHO_CSV: str(tamanho_csv).encode()}
+    )
+    # Grava com nome temporário e renomeia: o painel nunca lê um arquivo pela metade
+    tmp = ARQUIVO_PARQUET.with_name(f"_{ARQUIVO_PARQUET.name}.tmp")
+    pq.write_table(tabela, tmp)
+    tmp.replace(ARQUIVO_PARQUET)
+
+
+@dataclass
+class EstadoEscrita:
+    fila: queue.Queue = field(default_factory=queue.Queue)
+    # envio_id -> erro, para os envios que não chegaram ao CSV (avisados ao avaliador no próximo rerun)
+    falhas: dict[str, str] = field(default_factory=dict)
+    # Contagem e último erro para o painel do organizador
+    total_falhas: int = 0
+    ultimo_erro: str | None = None
+
+
+@st.cache_resource
+def escrita_em_segundo_plano() -> EstadoEscrita:
+    # Write-behind: uma única thread (compartilhada por todas as sessões) grava os envios no CSV,
+    # então o botão de envio não espera o disco e as gravações nunca se intercalam.
+    estado = EstadoEscrita()
+
+    def escritor() -> None:
+        while True:
+            envio_id, linhas = estado.fila.get()
+            # Primeiro o CSV (fonte da verdade), depois o espelho Parquet é posto em dia a partir dele.
+            # Uma falha no Parquet não afeta o CSV e é corrigida na próxima sincronização.
+            try:
+                try:
+                    tamanho_antes = ARQUIVO_SAIDA.stat().st_size if ARQUIVO_SAIDA.exists() else 0
+                    salvar_linhas_csv(linhas)
+                except Exception as e:
+                    logging.getLogger(__name__).exception("Falha ao gravar avaliações em %s", ARQUIVO_SAIDA)
+                    erro = f"{type(e).__name__}: {e}"
+                    estado.falhas[envio_id] = erro
+                    estado.total_falhas += 1
+                    estado.ultimo_erro = erro
+                    continue
+                try:
+                    sincronizar_parquet(linhas, tamanho_antes)
+                except Exception:
+                    logging.getLogger(__name__).exception("Falha ao sincronizar %s", ARQUIVO_PARQUET)
+            finally:
+                estado.fila.task_done()
+
+    threading.Thread(target=escritor, name="escritor-csv", daemon=True).start()
+    # Ao encerrar o servidor, espera a fila esvaziar para não perder envios pendentes
+    atexit.register(estado.fila.join)
+    return estado
+
+
+def bloco_avaliacao(avaliado_nome: str, chaves: dict[tuple[str, str], str], notas: np.ndarray) -> float:
     st.subheader(f"Avaliar: {avaliado_nome}")
-    notas = {}
-    for criterio in CRITERIOS:
+    # `notas` é a linha do avaliado na matriz de notas da sessão (view): grava direto nela,
+    # na mesma ordem de CRITERIOS (e das colunas do CSV).
+    for j, criterio in enumerate(CRITERIOS):
         # Slider (0–10). Pode ajustar step para 0.5 se preferir.
-        notas[criterio] = st.slider(
+        notas[j] = st.slider(
             criterio,
             min_value=0.0,
             max_value=10.0,
             value=5.0,
             step=0.5,
-            key=f"{avaliador_nome}->{avaliado_nome}:{criterio}",
+            key=chaves[(avaliado_nome, criterio)],
         )
-    media = sum(notas.values()) / len(notas)
+    media = float(notas.mean())
     st.caption(f"Média (5 critérios) de {avaliado_nome}: **{media:.2f}**")
-
-    # Guardar temporário no session_state
-    st.session_state.setdefault("avaliacoes", {})
-    st.session_state["avaliacoes"][avaliado_nome] = notas
     return media
 
 # ===================== PÁGINAS ===================== #
@@ -104,9 +219,18 @@ def pagina_avaliador():
     Cada avaliação tem **5 critérios** (0–10). Ao enviar, as respostas são salvas e você pode fechar.
     """)
 
-    avaliador_nome = st.selectbox("Quem é você?", ["— selecione —"] + TODOS_NOMES)
+    # Envios anteriores desta sessão que falharam na gravação em segundo plano
+    estado = escrita_em_segundo_plano()
+    pendentes = st.session_state.setdefault("envios_pendentes", [])
+    for envio_id in list(pendentes):
+        erro = estado.falhas.pop(envio_id, None)
+        if erro:
+            pendentes.remove(envio_id)
+            st.error(f"Seu envio anterior NÃO foi salvo ({erro}). Envie novamente ou procure o organizador.")
 
-    if not avaliador_nome or avaliador_nome == "— selecione —":
+    avaliador_nome = st.selectbox("Quem é você?", OPCOES_AVALIADOR)
+
+    if not avaliador_nome or avaliador_nome == OPCAO_VAZIA:
         st.info("Selecione seu nome para começar.")
         return
 
@@ -123,65 +247,95 @@ def pagina_avaliador():
     st.divider()
     st.markdown("### Avaliações deste sprint")
 
-    for colega in colegas:
-        bloco_avaliacao(avaliador_nome, colega)
+    # Chaves dos sliders montadas uma vez por sessão (não a cada rerun)
+    chave_keys = f"keys:{avaliador_nome}"
+    if chave_keys not in st.session_state:
+        st.session_state[chave_keys] = {
+            (c, cr): f"{avaliador_nome}->{c}:{cr}" for c in colegas for cr in CRITERIOS
+        }
+    chaves = st.session_state[chave_keys]
+    # Matriz de notas (linha = colega, coluna = critério), alocada uma vez por sessão
+    chave_scores = f"scores:{avaliador_nome}"
+    if chave_scores not in st.session_state:
+        st.session_state[chave_scores] = np.full((len(colegas), len(CRITERIOS)), 5.0)
+    scores = st.session_state[chave_scores]
+    for i, colega in enumerate(colegas):
+        bloco_avaliacao(colega, chaves, scores[i])
         st.divider()
 
     if st.button("Enviar minhas avaliações", type="primary"):
-        faltando = [c for c in colegas if c not in st.session_state.get("avaliacoes", {})]
-        if faltando:
-            st.warning("Finalize todas as avaliações antes de enviar.")
-            return
-
         ts = datetime.now().isoformat(timespec="seconds")
-        for colega in colegas:
-            notas = st.session_state["avaliacoes"][colega]
-            media = sum(notas.values()) / len(notas)
-            linha = [
-                ts,
-                avaliador_nome,
-                subgrupo,
-                colega,
-                *[notas[c] for c in CRITERIOS],
-                f"{media:.2f}",
-            ]
-            salvar_linha_csv(linha)
+        # As médias de todos os colegas saem de uma única redução vetorizada
+        medias = scores.mean(axis=1).round(2)
+        linhas = [
+            (ts, avaliador_nome, subgrupo, colega, *notas, media)
+            for colega, notas, media in zip(colegas, scores.tolist(), medias.tolist())
+        ]
+        envio_id = uuid4().hex
+        pendentes.append(envio_id)
+        estado.fila.put((envio_id, linhas))
 
         st.balloons()
         st.success("Avaliação feita com sucesso! Você já pode fechar o aplicativo.")
-        # Evitar reenvio acidental
-        st.session_state["avaliacoes"] = {}
 
 
-def carregar_dataframe() -> pd.DataFrame | None:
-    if not ARQUIVO_SAIDA.exists():
-        return None
-    df = pd.read_csv(ARQUIVO_SAIDA)
+# max_entries: cada envio gera uma chave nova; só as mais recentes interessam
+@st.cache_data(max_entries=2)
+def carregar_dataframe(mtime: float, size: int) -> pd.DataFrame:
+    # mtime/size (stat do CSV) entram como chave do cache: os dados são relidos apenas quando mudam.
+    # Lê o espelho Parquet (colunar) se ele reflete este tamanho de CSV; senão o CSV vale.
+    if tamanho_sincronizado() == size:
+        df = pd.read_parquet(ARQUIVO_PARQUET, columns=list(DTYPES_CSV))
+        return df.astype(DTYPES_CSV)
+    df = pd.read_csv(
+        ARQUIVO_SAIDA,
+        usecols=list(DTYPES_CSV),
+        dtype=DTYPES_CSV,
+        engine='c',
+    )
     return df
 
 
+@st.cache_data(max_entries=2)
 def consolidar_atrs(df: pd.DataFrame) -> pd.DataFrame:
     # ATSR por avaliado = média das médias (media_5_criterios) de todos os avaliadores
-    df['media_5_criterios'] = pd.to_numeric(df['media_5_criterios'], errors='coerce')
-    resumo = (df.groupby('avaliado_nome', as_index=False)
-                .agg(ATSR=('media_5_criterios', 'mean')))
+    resumo = (df.groupby('avaliado_nome', sort=False, observed=True)['media_5_criterios']
+                .mean()
+                .rename('ATSR')
+                .reset_index())
     # Adiciona subgrupo do avaliado
-    def subgrupo_avaliado(nome):
-        return next((sg for sg, nomes in SUBGRUPOS.items() if nome in nomes), '—')
-    resumo['Subgrupo'] = resumo['avaliado_nome'].apply(subgrupo_avaliado)
+    resumo['Subgrupo'] = (resumo['avaliado_nome'].astype(object)
+                            .map(NOME_TO_SUBGRUPO)
+                            .fillna(SEM_SUBGRUPO)
+                            .astype(SUBGRUPO_DTYPE))
     cols = ['Subgrupo', 'avaliado_nome', 'ATSR']
     resumo = resumo[cols].rename(columns={'avaliado_nome': 'Integrante'})
+    # Desempates do ranking como category: a ordenação compara códigos inteiros, não strings
+    resumo['Integrante'] = resumo['Integrante'].astype('category')
     resumo['ATSR'] = resumo['ATSR'].round(2)
     return resumo
 
 
+# 3 entradas: por rerun o painel gera respostas (CSV) e consolidação (CSV e XLSX)
+@st.cache_data(max_entries=3)
 def baixar_arquivo_bytes(df: pd.DataFrame, formato: str = 'csv') -> bytes:
+    # Cacheado por (conteúdo do df, formato): o XLSX só é regerado quando a consolidação muda
     if formato == 'csv':
         return df.to_csv(index=False).encode('utf-8')
     elif formato == 'xlsx':
         buf = io.BytesIO()
-        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='ATSR')
+        if xlsxwriter is not None:
+            # constant_memory grava cada linha direto no zip (sem montar o XML em memória).
+            # Exige escrita linha a linha, por isso não usa df.to_excel (que escreve por coluna).
+            wb = xlsxwriter.Workbook(buf, {'constant_memory': True, 'nan_inf_to_errors': True})
+            ws = wb.add_worksheet('ATSR')
+            ws.write_row(0, 0, df.columns, wb.add_format({'bold': True}))
+            for i, linha in enumerate(df.itertuples(index=False), start=1):
+                ws.write_row(i, 0, linha)
+            wb.close()
+        else:
+            with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+                df.to_excel(writer, index=False, sheet_name='ATSR')
         buf.seek(0)
         return buf.read()
     else:
@@ -200,16 +354,25 @@ def pagina_organizador():
         st.info("Digite a senha para acessar o painel.")
         return
 
-    df = carregar_dataframe()
+    estado = escrita_em_segundo_plano()
+    if estado.total_falhas:
+        st.error(
+            f"{estado.total_falhas} envio(s) não foram gravados em {ARQUIVO_SAIDA}. "
+            f"Último erro: {estado.ultimo_erro}"
+        )
+
+    stt = ARQUIVO_SAIDA.stat() if ARQUIVO_SAIDA.exists() else None
+    df = carregar_dataframe(stt.st_mtime, stt.st_size) if stt and stt.st_size else None
     if df is None or df.empty:
-        st.warning("Ainda não há respostas salvas (respostas_ATSR.csv).")
+        st.warning(f"Ainda não há respostas salvas ({ARQUIVO_SAIDA} / {ARQUIVO_PARQUET}).")
         return
 
     st.subheader("📥 Respostas brutas")
+    # st.dataframe só aqui (tabela que cresce); os rankings pequenos usam st.table (HTML estático)
     st.dataframe(df, use_container_width=True)
     st.download_button(
         "Baixar respostas (CSV)",
-        data=df.to_csv(index=False).encode('utf-8'),
+        data=baixar_arquivo_bytes(df, 'csv'),
         file_name='respostas_ATSR.csv',
         mime='text/csv',
     )
@@ -218,16 +381,18 @@ def pagina_organizador():
     st.subheader("📊 Consolidação – ATSR por integrante")
     resumo = consolidar_atrs(df)
 
-    # Ranking por subgrupo
+    # Ranking por subgrupo: ordena uma vez e particiona uma vez (sort estável mantém a ordem dentro do grupo)
+    resumo_ordenado = resumo.sort_values('ATSR', ascending=False, kind='stable')
+    por_subgrupo = dict(tuple(resumo_ordenado.groupby('Subgrupo', sort=False, observed=True)))
     for sg in SUBGRUPOS.keys():
         st.markdown(f"### {sg}")
-        sub = resumo[resumo['Subgrupo'] == sg].sort_values('ATSR', ascending=False)
-        st.dataframe(sub, use_container_width=True)
+        sub = por_subgrupo.get(sg, resumo_ordenado.iloc[0:0])
+        st.table(sub)
 
     st.markdown("### 🔝 Ranking Geral")
     geral = resumo.sort_values(['ATSR', 'Subgrupo', 'Integrante'], ascending=[False, True, True]).reset_index(drop=True)
     geral.index = geral.index + 1
-    st.dataframe(geral, use_container_width=True)
+    st.table(geral)
 
     # Downloads
     st.download_button(